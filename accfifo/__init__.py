@@ -32,14 +32,89 @@ Computes the FIFO accounting valuation and stock inventory.
 """
 
 import datetime
+import functools
 from collections import deque
 
 
+class FactorResolver(object):
+    """
+    Resolves entry factors, such as FX rates or contract multipliers,
+    from entry data and memoizes them in a bounded LRU cache.
+    """
+
+    def __init__(self, function, keys, maxsize=1024):
+        """
+        Initializes a factor resolver with the function to be called
+        with the values of the given entry data keys, such as currency
+        and date, and the maximum size of the cache.
+        """
+        ## Save data slots:
+        self.function = function
+        self.keys = tuple(keys)
+        self.maxsize = maxsize
+
+        ## Memoize the function:
+        self._resolve = functools.lru_cache(maxsize=maxsize)(function)
+
+    def __call__(self, *args):
+        """
+        Returns the factor for the given resolver inputs.
+        """
+        return self._resolve(*args)
+
+    def resolve(self, data):
+        """
+        Returns the factor for the given entry data.
+        """
+        return self._resolve(*[data[key] for key in self.keys])
+
+    def preload(self, args):
+        """
+        Resolves factors for the given iterable of resolver input
+        tuples ahead of a batch load.
+
+        Inputs are deduplicated, therefore each distinct input is
+        resolved only once.
+        """
+        for arg in set(args):
+            self._resolve(*arg)
+
+    def clear(self):
+        """
+        Clears the cache and its statistics.
+        """
+        self._resolve.cache_clear()
+
+    @property
+    def hits(self):
+        """
+        Returns the number of cache hits.
+        """
+        return self._resolve.cache_info().hits
+
+    @property
+    def misses(self):
+        """
+        Returns the number of cache misses.
+        """
+        return self._resolve.cache_info().misses
+
+    @property
+    def size(self):
+        """
+        Returns the number of cached factors.
+        """
+        return self._resolve.cache_info().currsize
+
+
 class Entry(object):
     """
     Defines an accounting entry.
     """
 
+    #: Position of the entry in the FIFO accounting, if stamped.
+    index = None
+
     def __init__(self, quantity, price, factor=1, **kwargs):
         """
         Initializes an entry object with quantity, price and arbitrary
@@ -47,8 +122,13 @@ class Entry(object):
         analysis purposes.
 
         Note the factor parameter. This prameter is applied to the
-        price.
+        price. It may also be a ``FactorResolver`` in which case the
+        factor is resolved from the arbitrary data.
         """
+        ## Resolve the factor if required:
+        if isinstance(factor, FactorResolver):
+            factor = factor.resolve(kwargs)
+
         ## Save data slots:
         self.quantity = quantity
         self.price = price
@@ -79,9 +159,64 @@ class Entry(object):
         return self.quantity * self.price * self.factor
 
     def copy(self, quantity=None):
-        return Entry(
-            quantity or self.quantity, self.price, self.factor, **self.data.copy()
+        ## Note that a zero quantity is a valid quantity to copy with:
+        entry = Entry(
+            self.quantity if quantity is None else quantity,
+            self.price,
+            self.factor,
+            **self.data.copy()
         )
+        if self.index is not None:
+            entry.index = self.index
+        return entry
+
+
+class Preview(object):
+    """
+    Defines the outcome of a hypothetical entry on a FIFO accounting.
+    """
+
+    def __init__(self, trace, stock, valuation, valuation_factored):
+        """
+        Initializes a preview with the would-be trace of the entry and
+        the would-be stock and inventory valuations.
+        """
+        ## Save data slots:
+        self.trace = trace
+        self.stock = stock
+        self.valuation = valuation
+        self.valuation_factored = valuation_factored
+
+    @property
+    def profit_and_loss(self):
+        """
+        Returns the profit and loss which would be realized by the entry.
+        """
+        return sum([e.price * e.quantity for pair in self.trace for e in pair])
+
+    @property
+    def profit_and_loss_factored(self):
+        """
+        Returns the profit and loss which would be realized by the
+        entry which is factored.
+        """
+        return sum(
+            [e.price * e.quantity * e.factor for pair in self.trace for e in pair]
+        )
+
+    @property
+    def avgcost(self):
+        """
+        Returns the would-be average cost of the inventory.
+        """
+        return None if self.stock == 0 else (self.valuation / self.stock)
+
+    @property
+    def avgcost_factored(self):
+        """
+        Returns the would-be average cost of the inventory which is factored.
+        """
+        return None if self.stock == 0 else (self.valuation_factored / self.stock)
 
 
 class FIFO(object):
@@ -90,27 +225,129 @@ class FIFO(object):
     the inventory in hand, (2) calculating the historical PnL trace.
     """
 
-    def __init__(self, entries=None):
+    #: Fields which are only available once the FIFO accounting is computed.
+    _COMPUTED = frozenset(
+        [
+            "_balance",
+            "_count",
+            "_realized",
+            "_realized_factored",
+            "_stock_factored",
+            "_valuation",
+            "_valuation_factored",
+            "inventory",
+            "trace",
+        ]
+    )
+
+    def __init__(
+        self, entries=None, lazy=False, resolver=None, observers=(), keep_trace=True
+    ):
         """
         Initializes and computes the FIFO accounting.
 
         Note that entries are supposed to be sorted.
+
+        By default, the FIFO accounting is computed eagerly, ie. right
+        here in the constructor, and the given entries are kept in the
+        ``_entries`` slot for the lifetime of the object.
+
+        If ``lazy`` is ``True``, nothing is computed until one of the
+        computed fields (``inventory``, ``trace`` or any property
+        depending on them) is accessed for the first time. In this
+        mode, entries can be any iterable (such as a generator) which
+        is consumed as a stream during the computation and is not
+        retained afterwards (``_entries`` is ``None``).
+
+        If a ``FactorResolver`` is given as ``resolver``, factors of
+        entries are resolved from their data during the computation.
+        In this case, the inventory and the trace consist of copies of
+        given entries with resolved factors.
+
+        Given ``observers`` are notified during the computation as
+        inventory entries are opened (``observer.opened(entry)``) and
+        closed (``observer.closed(opening, closing)``). In this case,
+        the inventory and the trace consist of copies of given entries
+        which are stamped with their position in the FIFO accounting
+        (``index``). Without observers, entries are not stamped.
+
+        If ``keep_trace`` is ``False``, closed inventory entries are not
+        kept in the trace (``trace`` is ``None``) and the realized
+        profit and loss is computed as entries are closed instead.
+        Along with observers, this allows processing closed inventory
+        entries in constant memory.
         """
-        ## Mark the start timestamp:
-        self._started_at = datetime.datetime.now()
+        ## Mark the start timestamp (lazy accounting is marked upon computing):
+        self._started_at = None if lazy else datetime.datetime.now()
         self._finished_at = None
 
+        ## Save the factor resolver and observers:
+        self._resolver = resolver
+        self._observers = tuple(observers)
+        self._keep_trace = keep_trace
+
+        ## If we are lazy, keep an iterator over entries until computing:
+        if lazy:
+            self._entries = None
+            self._pending = iter(entries or [])
+            return
+
         ## Save data slots:
         self._entries = entries or []
 
         ## Declare and initialize private fields to be used during computing:
-        self._balance = 0
-        self.inventory = deque()
-        self.trace = []
+        self._initialize()
 
         ## Start computing:
         self._compute()
 
+    def __getattr__(self, name):
+        """
+        Computes the lazy FIFO accounting upon the first access to any
+        of the computed fields.
+
+        If the computation fails, ``RuntimeError`` is raised upon this
+        and any later access to computed fields.
+        """
+        ## Note that this is called only if the attribute is missing,
+        ## ie. for computed fields of a lazy FIFO which is yet to be
+        ## computed (or whose computation has failed):
+        if name not in self._COMPUTED:
+            raise AttributeError(name)
+        if "_failed" in self.__dict__:
+            raise RuntimeError("FIFO computation has failed") from self._failed
+        if "_pending" not in self.__dict__:
+            raise AttributeError(name)
+
+        ## Mark the start timestamp:
+        self._started_at = datetime.datetime.now()
+
+        ## Consume the pending entries as a stream:
+        self._entries = self.__dict__["_pending"]
+        try:
+            self._initialize()
+            self._compute()
+        except Exception as error:
+            ## Drop the partial state and keep the error for later accesses:
+            for field in self._COMPUTED:
+                self.__dict__.pop(field, None)
+            self._failed = error
+            raise RuntimeError("FIFO computation has failed") from error
+        finally:
+            ## Drop the pending entries in any case:
+            self._entries = None
+            del self.__dict__["_pending"]
+
+        ## Done, return the attribute:
+        return getattr(self, name)
+
+    @property
+    def is_computed(self):
+        """
+        Indicates if the FIFO accounting is computed.
+        """
+        return "_pending" not in self.__dict__ and "_failed" not in self.__dict__
+
     @property
     def is_empty(self):
         """
@@ -144,6 +381,10 @@ class FIFO(object):
         """
         Returns the realized profit and loss.
         """
+        ## If we don't keep the trace, return the running profit and loss:
+        if self.trace is None:
+            return self._realized
+
         return sum(
             [e.price * e.quantity for entries_lst in self.trace for e in entries_lst]
         )
@@ -153,6 +394,10 @@ class FIFO(object):
         """
         Returns the realized profit and loss.
         """
+        ## If we don't keep the trace, return the running profit and loss:
+        if self.trace is None:
+            return self._realized_factored
+
         return sum(
             [
                 e.price * e.quantity * e.factor
@@ -186,6 +431,100 @@ class FIFO(object):
             return self._finished_at - self._started_at
         return None
 
+    def extend(self, entries):
+        """
+        Computes the FIFO accounting further with the given entries
+        which are supposed to follow the previous entries.
+
+        Note that given entries are not kept in the ``_entries`` slot.
+        """
+        self._compute(entries)
+
+    def preview(self, entry):
+        """
+        Previews the outcome of the given entry as if it was the next
+        entry of the FIFO accounting, without modifying the inventory,
+        the trace or the stock.
+
+        Only the inventory entries which would be closed by the given
+        entry are visited. Therefore, would-be valuations and average
+        costs are computed from the running valuation of the inventory
+        rather than summing up inventory entries. With float prices,
+        they may differ from those of the FIFO accounting with the
+        entry by floating point rounding errors, which are reset as the
+        inventory is exhausted.
+        """
+        ## Resolve the factor of a copy of the entry if required:
+        if self._resolver is not None:
+            entry = entry.copy()
+            entry.factor = self._resolver.resolve(entry.data)
+
+        ## Start with the current state of the accounting:
+        stock = self._balance + entry.quantity
+        valuation = self._valuation
+        valuation_factored = self._valuation_factored
+        trace = []
+
+        ## Same rules as in the computation apply. Either we would
+        ## push the entry to the inventory as is:
+        if (self._balance >= 0 and entry.buy) or (self._balance <= 0 and entry.sell):
+            valuation += entry.quantity * entry.price
+            valuation_factored += entry.quantity * entry.price * entry.factor
+
+        ## ... or fill existing stock entries:
+        elif not entry.zero:
+            ## Work on a copy of the entry:
+            entry = entry.copy()
+
+            ## Visit the earliest entries of the inventory as long as
+            ## the entry has quantity:
+            for earliest in self.inventory:
+                if entry.size <= earliest.size:
+                    ## Munch from the earliest and stop:
+                    munched = earliest.copy(-entry.quantity)
+                    trace.append([munched, entry])
+                    valuation -= munched.quantity * munched.price
+                    valuation_factored -= (
+                        munched.quantity * munched.price * munched.factor
+                    )
+
+                    ## The inventory would be exhausted if this is the last:
+                    if entry.size == earliest.size and earliest is self.inventory[-1]:
+                        valuation = 0
+                        valuation_factored = 0
+                    break
+
+                ## Consume the earliest entirely and continue:
+                munched = entry.copy(-earliest.quantity)
+                entry.quantity += earliest.quantity
+                trace.append([earliest.copy(), munched])
+                valuation -= earliest.quantity * earliest.price
+                valuation_factored -= (
+                    earliest.quantity * earliest.price * earliest.factor
+                )
+            else:
+                ## The inventory would be exhausted and the remaining
+                ## quantity would be the only stock entry:
+                valuation = entry.quantity * entry.price
+                valuation_factored = entry.quantity * entry.price * entry.factor
+
+        ## Done, return the preview:
+        return Preview(trace, stock, valuation, valuation_factored)
+
+    def _initialize(self):
+        """
+        Declares and initializes private fields to be used during computing.
+        """
+        self._balance = 0
+        self._count = 0
+        self._realized = 0
+        self._realized_factored = 0
+        self._stock_factored = 0
+        self._valuation = 0
+        self._valuation_factored = 0
+        self.inventory = deque()
+        self.trace = [] if self._keep_trace else None
+
     def _push(self, entry):
         """
         Pushes the entry to the inventory as new stock movement.
@@ -193,6 +532,35 @@ class FIFO(object):
         self.inventory.append(entry)
         self._balance += entry.quantity
 
+        ## Update the running stock and valuation:
+        value = entry.quantity * entry.price
+        self._stock_factored += entry.quantity * entry.factor
+        self._valuation += value
+        self._valuation_factored += value * entry.factor
+
+        ## Notify observers, if any:
+        if self._observers:
+            for observer in self._observers:
+                observer.opened(entry)
+
+    def _close(self, opening, closing):
+        """
+        Records the closed inventory entry to the trace (or to the
+        running profit and loss) and notifies observers.
+        """
+        ## Update the trace or the running profit and loss:
+        if self.trace is None:
+            self._realized += opening.price * opening.quantity
+            self._realized += closing.price * closing.quantity
+            self._realized_factored += opening.price * opening.quantity * opening.factor
+            self._realized_factored += closing.price * closing.quantity * closing.factor
+        else:
+            self.trace.append([opening, closing])
+
+        ## Notify observers:
+        for observer in self._observers:
+            observer.closed(opening, closing)
+
     def _fill(self, entry):
         """
         Fills existing stock entries by calculating new stocks if required.
@@ -210,12 +578,17 @@ class FIFO(object):
         ## creating a copy of the entry:
         entry = entry.copy()
 
+        ## Closed inventory entries go straight to the trace unless it
+        ## is not kept or there are observers to notify:
+        trace = None if self._observers else self.trace
+        inventory = self.inventory
+
         ## We will continue as long as the entry has quantity:
-        while not entry.zero:
+        while entry.quantity != 0:
             ## Let's consume the earliest entry from the
             ## inventory. But, if the inventory is empty, we can then
             ## safely push the entry to the inventory:
-            if self.is_empty:
+            if not inventory:
                 ## Yes, the inventory is empty. Push:
                 self._push(entry)
 
@@ -223,7 +596,7 @@ class FIFO(object):
                 return
 
             ## We have entries in the inventory. Get the earliest:
-            earliest = self.inventory.popleft()
+            earliest = inventory.popleft()
 
             ## There are 3 possible cases:
             ##
@@ -233,7 +606,7 @@ class FIFO(object):
             ##
             ## Note that in any of these cases we will update the
             ## trace, too. Let's start:
-            if entry.size <= earliest.size:
+            if abs(entry.quantity) <= abs(earliest.quantity):
                 ## We will now munch from the earliest:
                 munched = earliest.copy(-entry.quantity)
 
@@ -242,13 +615,26 @@ class FIFO(object):
 
                 ## Put earliest back to the inventory if still have quantity:
                 if earliest.quantity != 0:
-                    self.inventory.appendleft(earliest)
+                    inventory.appendleft(earliest)
 
                 ## Update the trace:
-                self.trace.append([munched, entry])
+                if trace is None:
+                    self._close(munched, entry)
+                else:
+                    trace.append([munched, entry])
 
-                ## Update the balance:
+                ## Update the balance and the running valuation:
                 self._balance += entry.quantity
+                value = munched.quantity * munched.price
+                self._stock_factored -= munched.quantity * munched.factor
+                self._valuation -= value
+                self._valuation_factored -= value * munched.factor
+
+                ## Reset the running valuation if the inventory is exhausted:
+                if not inventory:
+                    self._stock_factored = 0
+                    self._valuation = 0
+                    self._valuation_factored = 0
 
                 ## Done, return:
                 return
@@ -260,19 +646,56 @@ class FIFO(object):
                 entry.quantity += earliest.quantity
 
                 ## Update the trace:
-                self.trace.append([earliest, munched])
+                if trace is None:
+                    self._close(earliest, munched)
+                else:
+                    trace.append([earliest, munched])
 
-                ## Update the balance and continue:
+                ## Update the balance and the running valuation, and continue:
                 self._balance += munched.quantity
-
-    def _compute(self):
+                value = earliest.quantity * earliest.price
+                self._stock_factored -= earliest.quantity * earliest.factor
+                self._valuation -= value
+                self._valuation_factored -= value * earliest.factor
+
+                ## Reset the running valuation if the inventory is exhausted:
+                if not inventory:
+                    self._stock_factored = 0
+                    self._valuation = 0
+                    self._valuation_factored = 0
+
+    def _compute(self, entries=None):
         """
-        Computes the FIFO accounting for the given entries and produces
-        the (1) cost of the inventory in hand, (2) historical PnL trace.
+        Computes the FIFO accounting for the given entries (defaults to
+        entries given upon initialization) and produces the (1) cost of
+        the inventory in hand, (2) historical PnL trace.
         """
+        ## Entries are copied if they are to be stamped with their
+        ## positions (for observers) or to be resolved their factors,
+        ## so that given entries (which may be shared with other FIFO
+        ## accountings) are not modified:
+        observers = self._observers
+        resolver = self._resolver
+
         ## We will iterate over the entries and operate on the
         ## inventory. Let's start:
-        for entry in self._entries:
+        for entry in self._entries if entries is None else entries:
+            ## Copy, stamp and resolve the entry if required:
+            if observers or resolver is not None:
+                entry = entry.copy()
+                if observers:
+                    entry.index = self._count
+                if resolver is not None:
+                    entry.factor = resolver.resolve(entry.data)
+            self._count += 1
+
+            ## Skip "0"-quantity entries. Note that they would
+            ## otherwise be pushed to the inventory as "sell" entries
+            ## when the stock is not positive:
+            quantity = entry.quantity
+            if quantity == 0:
+                continue
+
             ## We will add new stock to the inventory or remove
             ## existing stock from the inventory. It looks pretty
             ## straight-forward. But is it?
@@ -301,8 +724,8 @@ class FIFO(object):
             ## | negative | sell  | Keep removing |
             ##
             ## Let's do this:
-            if (self._balance >= 0 and entry.buy) or (
-                self._balance <= 0 and entry.sell
+            if (self._balance >= 0 and quantity > 0) or (
+                self._balance <= 0 and quantity < 0
             ):
                 ## Yes, we will push the entry to the inventory as is:
                 self._push(entry)
@@ -316,8 +739,8 @@ class FIFO(object):
             ## | positive | sell  | Munch from stock (and reverse if required) |
             ## | negative | buy   | Fill backorders (and reverse if required)  |
             ##
-            ## Note that we must make sure that we skip "0"-quantity entries.
-            elif not entry.zero:
+            ## Note that "0"-quantity entries are already skipped above.
+            else:
                 ## OK, the entry is not zero. We will proceeding
                 ## filling positions:
                 self._fill(entry)
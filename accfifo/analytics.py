@@ -0,0 +1,92 @@
+"""
+Provides FIFO accounting observers for holding period and open
+inventory age analytics.
+"""
+
+from bisect import bisect_right
+
+
+class Histogram(object):
+    """
+    Defines a quantity-weighted histogram over given bin edges.
+
+    There are ``len(edges) + 1`` bins: The first bin is for values
+    less than the first edge, the last bin is for values greater than
+    or equal to the last edge, and bin ``i`` is for values in
+    ``[edges[i - 1], edges[i])``.
+    """
+
+    def __init__(self, edges):
+        """
+        Initializes an empty histogram with the given sorted edges.
+        """
+        ## Save data slots:
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+
+    def add(self, value, weight=1):
+        """
+        Adds the given value with the given weight.
+        """
+        self.counts[bisect_right(self.edges, value)] += weight
+
+
+class HoldingPeriods(object):
+    """
+    Observes a FIFO accounting and maintains the histogram of holding
+    periods of closed inventory entries, and the open inventory
+    quantities by opening time, as the FIFO accounting is computed.
+
+    Times are taken from entries by the given clock function which
+    defaults to positions of entries in the FIFO accounting. For
+    example, ``lambda entry: entry.data["timestamp"]`` takes times
+    from entry data.
+    """
+
+    def __init__(self, edges, clock=None):
+        """
+        Initializes the observer with the bin edges of holding periods
+        and open inventory ages, and the clock function.
+        """
+        ## Save data slots:
+        self.edges = list(edges)
+        self.clock = clock or (lambda entry: entry.index)
+
+        ## Initialize the histogram of holding periods:
+        self.holding = Histogram(self.edges)
+
+        ## Open quantities by opening time:
+        self.open = {}
+
+    def opened(self, entry):
+        """
+        Records the opened inventory entry.
+        """
+        if entry.size:
+            time = self.clock(entry)
+            self.open[time] = self.open.get(time, 0) + entry.size
+
+    def closed(self, opening, closing):
+        """
+        Records the closed inventory entry.
+        """
+        ## Record the holding period:
+        time = self.clock(opening)
+        self.holding.add(self.clock(closing) - time, opening.size)
+
+        ## Update the open quantity:
+        quantity = self.open.pop(time, 0) - opening.size
+        if quantity:
+            self.open[time] = quantity
+
+    def ages(self, now):
+        """
+        Returns the histogram of open inventory ages as of the given time.
+
+        Note that this visits distinct opening times of the open
+        inventory, not the inventory entries.
+        """
+        histogram = Histogram(self.edges)
+        for time, quantity in self.open.items():
+            histogram.add(now - time, quantity)
+        return histogram
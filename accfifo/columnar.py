@@ -0,0 +1,76 @@
+"""
+Provides a columnar representation of open inventories of many FIFO
+accountings (books) for vectorized mark-to-market.
+
+Note that this module requires numpy.
+"""
+
+import numpy
+
+
+class OpenInventory(object):
+    """
+    Keeps the stock and the valuation of the open inventory of a set
+    of books in columns.
+
+    Columns are gathered from the running totals which FIFO accountings
+    maintain as they are computed, ie. without visiting inventory
+    entries.
+    """
+
+    def __init__(self, fifos):
+        """
+        Initializes the columnar open inventory of the given FIFO
+        accountings, each being a book.
+
+        Books are identified by their position in the given sequence.
+        """
+        ## Save data slots:
+        self.fifos = list(fifos)
+
+        ## Gather columns:
+        self.refresh()
+
+    @property
+    def books(self):
+        """
+        Returns the number of books.
+        """
+        return len(self.fifos)
+
+    def _gather(self, field):
+        """
+        Returns the column of the given running total of books.
+        """
+        return numpy.fromiter(
+            (getattr(fifo, field) for fifo in self.fifos), float, len(self.fifos)
+        )
+
+    def refresh(self):
+        """
+        Gathers the columns again, such as after books are computed
+        further with new entries.
+        """
+        self.stock = self._gather("_balance")
+        self.stock_factored = self._gather("_stock_factored")
+        self.valuation = self._gather("_valuation")
+        self.valuation_factored = self._gather("_valuation_factored")
+
+    def mark(self, prices):
+        """
+        Returns the unrealized profit and loss and the exposure of
+        each book for the given vector of mark prices of books.
+        """
+        prices = numpy.asarray(prices, dtype=float)
+        exposure = self.stock * prices
+        return exposure - self.valuation, exposure
+
+    def mark_factored(self, prices):
+        """
+        Returns the unrealized profit and loss and the exposure of
+        each book for the given vector of mark prices of books which
+        are factored.
+        """
+        prices = numpy.asarray(prices, dtype=float)
+        exposure = self.stock_factored * prices
+        return exposure - self.valuation_factored, exposure
@@ -0,0 +1,195 @@
+"""
+Follows continuously growing CSV files of entries and computes the
+FIFO accounting of each file as new rows are appended.
+
+Rows are formatted as in the module runner, ie. quantity, price and
+optionally factor. The byte offset of each file is persisted together
+with its FIFO accounting, therefore a restart resumes where it left
+off.
+
+FIFO accountings do not keep the trace, therefore the persisted state
+consists of the open inventory and running totals (such as the stock
+and the realized profit and loss) only. The state is persisted
+periodically rather than upon every update, and a restart replays the
+rows appended since the last save.
+
+Run as::
+
+    python -m accfifo.follow --state state.pickle fills1.csv fills2.csv
+"""
+
+import csv
+import os
+import pickle
+import time
+
+from accfifo import FIFO, Entry
+
+
+def _parse(row):
+    """
+    Parses the given CSV row into an entry.
+    """
+    return Entry(float(row[0]), float(row[1]), float(row[2]) if len(row) > 2 else 1)
+
+
+class Follower(object):
+    """
+    Follows files of entries and feeds new rows to a FIFO accounting
+    per file.
+    """
+
+    def __init__(self, paths, state=None):
+        """
+        Initializes the follower with the paths of files to follow and
+        the path of the file to persist the state to, if any.
+
+        If the state file exists, offsets and FIFO accountings are
+        restored from it.
+        """
+        ## Save data slots:
+        self.paths = list(paths)
+        self.state = state
+
+        ## Restore the state, if any:
+        if state is not None and os.path.exists(state):
+            with open(state, "rb") as stream:
+                self.offsets, self.fifos = pickle.load(stream)
+        else:
+            self.offsets, self.fifos = {}, {}
+
+        ## Initialize files which are not in the state:
+        for path in self.paths:
+            self.offsets.setdefault(path, 0)
+            self.fifos.setdefault(path, FIFO(keep_trace=False))
+
+    def poll(self):
+        """
+        Feeds the rows appended to files since the last poll to the
+        respective FIFO accountings, and returns the paths of files
+        with new rows.
+
+        Only complete rows (ie. terminated by a newline) are consumed.
+        If a file is truncated, it is followed from its beginning. If
+        any of the appended rows can not be parsed, the error is raised
+        and none of the rows are consumed.
+        """
+        ## Keep updated paths:
+        updated = []
+
+        ## Iterate over files:
+        for path in self.paths:
+            ## Skip files which are not created yet:
+            if not os.path.exists(path):
+                continue
+
+            ## Read the appended content:
+            with open(path, "rb") as stream:
+                if os.fstat(stream.fileno()).st_size < self.offsets[path]:
+                    self.offsets[path] = 0
+                stream.seek(self.offsets[path])
+                content = stream.read()
+
+            ## Consume complete rows only:
+            size = content.rfind(b"\n") + 1
+            if size == 0:
+                continue
+
+            ## Parse all rows before feeding any, so that a bad row
+            ## leaves both the FIFO accounting and the offset as is:
+            rows = csv.reader(content[:size].decode().splitlines())
+            entries = [_parse(row) for row in rows if row]
+
+            ## Feed the rows:
+            self.fifos[path].extend(entries)
+
+            ## Update the offset:
+            self.offsets[path] += size
+            updated.append(path)
+
+        ## Done, return updated paths:
+        return updated
+
+    def save(self):
+        """
+        Persists offsets and FIFO accountings to the state file.
+
+        Note that FIFO accountings do not keep the trace, therefore the
+        state grows with the open inventory only.
+        """
+        ## Write to a temporary file and replace the state file with it:
+        temporary = "%s.tmp" % self.state
+        with open(temporary, "wb") as stream:
+            pickle.dump((self.offsets, self.fifos), stream, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.state)
+
+    def follow(self, callback, interval=0.1, save_interval=5.0):
+        """
+        Polls files forever with the given interval (in seconds) and
+        calls the given callback with the path and the FIFO accounting
+        of each updated file.
+
+        The state is persisted, if required, at most once per given
+        save interval (in seconds) and upon exit.
+        """
+        ## Keep track of unsaved updates:
+        saved_at = time.time()
+        dirty = False
+
+        try:
+            while True:
+                ## Poll files and report updates first:
+                updated = self.poll()
+                for path in updated:
+                    callback(path, self.fifos[path])
+                dirty = dirty or bool(updated)
+
+                ## Persist the state if required and due:
+                if dirty and self.state is not None:
+                    if time.time() - saved_at >= save_interval:
+                        self.save()
+                        saved_at = time.time()
+                        dirty = False
+
+                ## Wait for the next poll:
+                time.sleep(interval)
+        finally:
+            ## Persist unsaved updates upon exit:
+            if dirty and self.state is not None:
+                self.save()
+
+
+if __name__ == "__main__":
+    ## NOTE: Not for production purposes.
+    import argparse
+
+    ## Parse arguments:
+    parser = argparse.ArgumentParser(description="Follows files of entries.")
+    parser.add_argument("paths", metavar="PATH", nargs="+", help="file of entries")
+    parser.add_argument("--state", help="file to persist the state to")
+    parser.add_argument(
+        "--interval", type=float, default=0.1, help="poll interval in seconds"
+    )
+    parser.add_argument(
+        "--save-interval",
+        type=float,
+        default=5.0,
+        help="state save interval in seconds",
+    )
+    args = parser.parse_args()
+
+    ## Print output upon updates:
+    def report(path, fifo):
+        print(
+            "%s: stock=%s avgcost=%s pnl=%s"
+            % (path, fifo.stock, fifo.avgcost, fifo.profit_and_loss),
+            flush=True,
+        )
+
+    ## Follow files:
+    try:
+        Follower(args.paths, args.state).follow(
+            report, args.interval, args.save_interval
+        )
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,91 @@
+"""
+Provides a thread-safe ledger of FIFO accountings by key for
+ingesting entries from multiple threads.
+"""
+
+import threading
+from collections import namedtuple
+
+from accfifo import FIFO
+
+#: Defines a consistent snapshot of a FIFO accounting.
+Snapshot = namedtuple("Snapshot", ["stock", "avgcost", "profit_and_loss"])
+
+
+class _Shard(object):
+    """
+    Defines a shard of the ledger with its own lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fifos = {}
+        self.snapshots = {}
+
+
+class Ledger(object):
+    """
+    Keeps FIFO accountings by key, such as instrument or account,
+    sharded over a number of locks.
+
+    Writers to keys of different shards do not block each other.
+    Readers do not block at all: They get the snapshot published by
+    the last write to the key.
+    """
+
+    def __init__(self, shards=16):
+        """
+        Initializes the ledger with the given number of shards.
+        """
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def _shard(self, key):
+        """
+        Returns the shard of the given key.
+        """
+        return self._shards[hash(key) % len(self._shards)]
+
+    def extend(self, key, entries):
+        """
+        Computes the FIFO accounting of the given key further with the
+        given entries and publishes its new snapshot.
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            ## Get the FIFO accounting, which does not keep the trace:
+            fifo = shard.fifos.get(key)
+            if fifo is None:
+                fifo = shard.fifos[key] = FIFO(keep_trace=False)
+
+            ## Compute further:
+            fifo.extend(entries)
+
+            ## Publish the new snapshot. Note that the average cost is
+            ## computed using the running valuation of the inventory:
+            shard.snapshots[key] = Snapshot(
+                fifo._balance,
+                None if fifo._balance == 0 else (fifo._valuation / fifo._balance),
+                fifo.profit_and_loss,
+            )
+
+    def add(self, key, entry):
+        """
+        Computes the FIFO accounting of the given key further with the
+        given entry and publishes its new snapshot.
+        """
+        self.extend(key, [entry])
+
+    def snapshot(self, key):
+        """
+        Returns the last snapshot of the given key, if any.
+        """
+        return self._shard(key).snapshots.get(key)
+
+    def snapshots(self):
+        """
+        Returns the last snapshots of all keys.
+        """
+        snapshots = {}
+        for shard in self._shards:
+            snapshots.update(shard.snapshots.copy())
+        return snapshots
@@ -0,0 +1,160 @@
+"""
+Loads entries in batches from binary files of fixed-width records and
+from numpy ``.npy`` files.
+
+Records consist of quantity, price and factor, followed by optional
+fields which are saved as entry data if their names are given. Batches
+of records are unpacked into flat columns which entries are built
+from, ie. without parsing intermediate strings or creating per-row
+objects other than entries. If entry data is requested, the data of
+each entry is collected per row. Native formats whose records are
+padded for alignment are unpacked record by record.
+"""
+
+import mmap
+import os
+import struct
+from itertools import chain
+
+from accfifo import FIFO, Entry
+
+#: Default record format: quantity, price and factor as little-endian doubles.
+RECORD = "<ddd"
+
+
+def _entries(columns, names):
+    """
+    Returns entries for the given columns, ie. quantity, price, factor
+    and further columns. Further columns are saved as data if their
+    names are given.
+    """
+    ## Fast path, quantity, price and factor only:
+    if not names:
+        return list(map(Entry, columns[0], columns[1], columns[2]))
+
+    ## Build entries with data:
+    return [
+        Entry(quantity, price, factor, **dict(zip(names, data)))
+        for quantity, price, factor, *data in zip(*columns[: 3 + len(names)])
+    ]
+
+
+def _batch(fmt, count):
+    """
+    Returns the ``struct`` of given number of consecutive records of
+    given format, or ``None`` if records of the format are padded for
+    alignment (native formats only), ie. can not be unpacked at once.
+    """
+    ## Repeat the format after the byte order character, if any:
+    order = fmt[:1] if fmt[:1] in "@=<>!" else ""
+    batch = struct.Struct(order + fmt[len(order) :] * count)
+    return batch if batch.size == struct.calcsize(fmt) * count else None
+
+
+def iter_binary(path, fmt=RECORD, names=(), batchsize=65536):
+    """
+    Yields batches of entries from the given binary file of records
+    of given ``struct`` format.
+
+    The first three fields of records are quantity, price and factor.
+    Remaining fields are saved as entry data if their names are given.
+    Trailing incomplete records are ignored.
+    """
+    ## Prepare the record and the batch of records:
+    record = struct.Struct(fmt)
+    width = len(record.unpack(bytes(record.size)))
+    names = tuple(names)
+    step = record.size * batchsize
+    batches = {}
+
+    with open(path, "rb") as stream:
+        ## Note that empty files can not be mapped:
+        size = os.fstat(stream.fileno()).st_size
+        size -= size % record.size
+        if size == 0:
+            return
+
+        ## Map the file and unpack batches of records in place:
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            with memoryview(view) as buffer:
+                for start in range(0, size, step):
+                    ## Get the batch for the number of records, the
+                    ## last one being shorter:
+                    count = (min(start + step, size) - start) // record.size
+                    if count not in batches:
+                        batches[count] = _batch(fmt, count)
+
+                    ## Unpack fields of records as a flat sequence:
+                    if batches[count] is None:
+                        with buffer[start : start + count * record.size] as chunk:
+                            rows = record.iter_unpack(chunk)
+                            values = tuple(chain.from_iterable(rows))
+                    else:
+                        values = batches[count].unpack_from(buffer, start)
+
+                    ## Build entries from columns:
+                    columns = [
+                        values[i::width] for i in range(min(width, 3 + len(names)))
+                    ]
+                    yield _entries(columns, names)
+
+
+def dump_binary(entries, path, fmt=RECORD, names=()):
+    """
+    Writes the given entries to the given binary file as records of
+    given ``struct`` format.
+
+    Data of entries with given names are written after quantity,
+    price and factor.
+    """
+    record = struct.Struct(fmt)
+    with open(path, "wb") as stream:
+        for entry in entries:
+            stream.write(
+                record.pack(
+                    entry.quantity,
+                    entry.price,
+                    entry.factor,
+                    *[entry.data[name] for name in names]
+                )
+            )
+
+
+def iter_npy(path, names=(), batchsize=65536):
+    """
+    Yields batches of entries from the given numpy ``.npy`` file of a
+    two-dimensional array.
+
+    The first three columns are quantity, price and factor. Remaining
+    columns are saved as entry data if their names are given.
+
+    Note that this function requires numpy.
+    """
+    import numpy
+
+    ## Map the array:
+    array = numpy.load(path, mmap_mode="r")
+    names = tuple(names)
+
+    ## Convert batches of rows by columns:
+    for start in range(0, len(array), batchsize):
+        batch = array[start : start + batchsize]
+        columns = [batch[:, i].tolist() for i in range(3 + len(names))]
+        yield _entries(columns, names)
+
+
+def load(batches, fifo=None):
+    """
+    Feeds the given batches of entries to the given FIFO accounting
+    (defaults to a new one) and returns it.
+    """
+    ## Create the FIFO accounting if required:
+    if fifo is None:
+        fifo = FIFO()
+
+    ## Feed batches:
+    for batch in batches:
+        fifo.extend(batch)
+
+    ## Done, return the FIFO accounting:
+    return fifo
@@ -0,0 +1,172 @@
+"""
+Computes the FIFO accounting of a single long ledger in parallel.
+
+Entries are split into consecutive (time) chunks. First, the net flow
+of each chunk is computed which gives the stock at the beginning of
+each chunk. Then, each chunk is computed in a worker process on top of
+a single opening entry which stands for the stock carried from the
+previous chunks. Finally, chunk results are stitched together by
+filling the carried stock with the entries which closed the opening
+entry, which produces the same result as the sequential computation.
+
+Workers send back a summary of their chunk only, ie. the entries which
+closed the opening entry, the remaining inventory and the realized
+profit and loss of the chunk. The trace of the chunk is sent back only
+if it is to be kept. Entries are shared with workers upon their start
+rather than being sent with each chunk.
+
+Note that quantities are supposed to be exact (such as integers) as
+the stock at the beginning of a chunk is computed by summing net flows
+of chunks instead of entries one by one.
+"""
+
+import datetime
+import multiprocessing
+import os
+
+from accfifo import FIFO, Entry
+
+#: Entries shared with the worker process.
+_entries = None
+
+
+class _Opening(Entry):
+    """
+    Defines the opening entry which stands for the stock carried from
+    previous chunks.
+    """
+
+    def copy(self, quantity=None):
+        return _Opening(self.quantity if quantity is None else quantity, self.price)
+
+
+def _flow(entries):
+    """
+    Returns the net flow of the given entries.
+    """
+    return sum([entry.quantity for entry in entries])
+
+
+def _share(entries):
+    """
+    Shares the given entries with the worker process.
+    """
+    global _entries
+    _entries = entries
+
+
+def _summarize(args):
+    """
+    Computes the FIFO accounting of the chunk of shared entries between
+    the given positions on top of the stock carried from previous
+    chunks, and returns its summary.
+
+    The summary consists of entries which closed the carried stock,
+    the trace of the chunk (if it is to be kept, ``None`` otherwise),
+    the remaining inventory of the chunk and the realized profit and
+    loss of the chunk.
+    """
+    ## Get arguments:
+    start, end, balance, keep_trace = args
+
+    ## Create an empty FIFO accounting starting at the position of the chunk:
+    fifo = FIFO()
+    fifo._count = start
+
+    ## Open the carried stock, if any:
+    if balance != 0:
+        fifo._push(_Opening(balance, 0))
+
+    ## Compute the chunk:
+    fifo.extend(_entries[start:end])
+
+    ## Split the trace into entries closing the carried stock and the
+    ## trace of the chunk. Note that the carried stock is the earliest
+    ## inventory entry, therefore it is closed first:
+    carried = 0
+    while carried < len(fifo.trace) and isinstance(fifo.trace[carried][0], _Opening):
+        carried += 1
+    closings = [pair[1] for pair in fifo.trace[:carried]]
+    trace = fifo.trace[carried:]
+
+    ## Compute the realized profit and loss of the chunk:
+    realized = sum([e.price * e.quantity for pair in trace for e in pair])
+    realized_factored = sum(
+        [e.price * e.quantity * e.factor for pair in trace for e in pair]
+    )
+
+    ## Done, return the summary:
+    return (
+        closings,
+        trace if keep_trace else None,
+        [entry for entry in fifo.inventory if not isinstance(entry, _Opening)],
+        realized,
+        realized_factored,
+    )
+
+
+def compute(entries, chunks=None, processes=None, keep_trace=True):
+    """
+    Computes the FIFO accounting of the given entries in parallel and
+    returns the ``FIFO`` accounting.
+
+    Entries are split into given number of chunks (defaults to the
+    number of processes) and computed in a pool of given number of
+    processes (defaults to the number of CPUs). Note that more chunks
+    mean more carried stock to be stitched in this process.
+
+    If ``keep_trace`` is ``False``, the returned FIFO accounting does
+    not keep the trace (see ``FIFO``) and chunk traces are not sent
+    back from workers, which is what makes the computation faster
+    than the sequential one.
+    """
+    ## Mark the start timestamp:
+    started_at = datetime.datetime.now()
+
+    ## Decide on number of processes and chunks:
+    processes = processes or os.cpu_count() or 1
+    chunks = max(1, min(chunks or processes, len(entries)))
+
+    ## Split entries into chunks:
+    size = max(1, -(-len(entries) // chunks))
+    starts = list(range(0, len(entries), size))
+    ends = starts[1:] + [len(entries)]
+
+    ## Compute the stock at the beginning of each chunk:
+    balances = [0]
+    for start, end in zip(starts[:-1], ends[:-1]):
+        balances.append(balances[-1] + _flow(entries[start:end]))
+
+    ## Compute chunks and stitch them in order as they are computed:
+    fifo = FIFO(keep_trace=keep_trace)
+    fifo._count = len(entries)
+    tasks = [
+        (start, end, balance, keep_trace)
+        for start, end, balance in zip(starts, ends, balances)
+    ]
+    with multiprocessing.Pool(processes, _share, (entries,)) as pool:
+        for summary in pool.imap(_summarize, tasks):
+            closings, trace, inventory, realized, realized_factored = summary
+
+            ## Entries closing the opening entry close the carried stock:
+            for entry in closings:
+                fifo._fill(entry)
+
+            ## Add the trace or the realized profit and loss of the chunk:
+            if keep_trace:
+                fifo.trace.extend(trace)
+            else:
+                fifo._realized += realized
+                fifo._realized_factored += realized_factored
+
+            ## The remaining carried stock, if any, is followed by the
+            ## stock opened in the chunk:
+            for entry in inventory:
+                fifo._push(entry)
+
+    ## Mark the computation timestamps:
+    fifo._started_at = started_at
+    fifo._finished_at = datetime.datetime.now()
+
+    ## Done, return the FIFO accounting:
+    return fifo
@@ -0,0 +1,113 @@
+"""
+Writes closed inventory entries (tax lots) as they are closed during
+the FIFO computation, as CSV or JSON lines.
+
+Along with a FIFO accounting which does not keep the trace, reports
+are written in constant memory::
+
+    with open_report("lots.csv.gz") as stream:
+        writer = LotWriter(stream, columns=["timestamp"])
+        fifo = FIFO(entries, observers=[writer], keep_trace=False)
+"""
+
+import csv
+import gzip
+import io
+import json
+
+#: Fields of closed inventory entries.
+FIELDS = [
+    "open_index",
+    "close_index",
+    "quantity",
+    "open_price",
+    "close_price",
+    "profit_and_loss",
+    "profit_and_loss_factored",
+]
+
+
+def open_report(path, compress=None, buffering=1 << 20):
+    """
+    Opens the given report file for writing with the given buffer size.
+
+    The file is compressed with gzip if ``compress`` is ``True`` or if
+    it is ``None`` (default) and the path ends with ``.gz``.
+
+    Reports are encoded in UTF-8 regardless of the locale.
+    """
+    ## Decide on compression:
+    if compress is None:
+        compress = path.endswith(".gz")
+
+    ## Open the file:
+    if compress:
+        return io.TextIOWrapper(
+            io.BufferedWriter(gzip.open(path, "wb", compresslevel=6), buffering),
+            encoding="utf-8",
+            newline="",
+        )
+    return open(path, "w", buffering=buffering, encoding="utf-8", newline="")
+
+
+class LotWriter(object):
+    """
+    Observes a FIFO accounting and writes closed inventory entries to
+    the given text stream.
+    """
+
+    def __init__(self, stream, format="csv", columns=()):
+        """
+        Initializes the writer with the text stream, the format
+        (``csv`` or ``jsonl``) and the entry data columns to be
+        written for opening and closing entries.
+
+        For CSV, the header is written right away.
+        """
+        ## Save data slots:
+        self.stream = stream
+        self.format = format
+        self.columns = list(columns)
+        self.fields = FIELDS + [
+            "%s_%s" % (side, column)
+            for column in self.columns
+            for side in ["open", "close"]
+        ]
+
+        ## Prepare the writer:
+        if format == "csv":
+            self._writer = csv.writer(stream)
+            self._writer.writerow(self.fields)
+        elif format != "jsonl":
+            raise ValueError("Unknown report format: %s" % format)
+
+    def opened(self, entry):
+        """
+        Ignores the opened inventory entry.
+        """
+
+    def closed(self, opening, closing):
+        """
+        Writes the closed inventory entry.
+        """
+        ## Build the row:
+        row = [
+            opening.index,
+            closing.index,
+            opening.quantity,
+            opening.price,
+            closing.price,
+            opening.price * opening.quantity + closing.price * closing.quantity,
+            opening.price * opening.quantity * opening.factor
+            + closing.price * closing.quantity * closing.factor,
+        ]
+        for column in self.columns:
+            row.append(opening.data.get(column))
+            row.append(closing.data.get(column))
+
+        ## Write the row:
+        if self.format == "csv":
+            self._writer.writerow(row)
+        else:
+            self.stream.write(json.dumps(dict(zip(self.fields, row))))
+            self.stream.write("\n")
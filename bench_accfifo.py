@@ -0,0 +1,341 @@
+"""
+Benchmarks FIFO accounting facilities.
+
+Run all benchmarks::
+
+    python bench_accfifo.py
+
+... or some of them::
+
+    python bench_accfifo.py mark
+"""
+
+import random
+import sys
+import timeit
+
+from accfifo import FIFO, Entry
+
+
+def entries(count, seed=42):
+    """
+    Generates random entries.
+    """
+    rng = random.Random(seed)
+    return [
+        Entry(rng.randint(-100, 100), rng.randint(1, 100), rng.choice([1, 2]))
+        for _ in range(count)
+    ]
+
+
+def report(name, seconds, count, unit):
+    """
+    Prints the benchmark result.
+    """
+    print("%-40s: %10.4fs %14.0f %s/s" % (name, seconds, count / seconds, unit))
+
+
+def bench_mark(books=2000, size=200):
+    """
+    Benchmarks mark-to-market of open inventories.
+    """
+    from accfifo.columnar import OpenInventory
+
+    ## Prepare books with open inventories of given size and marks:
+    rng = random.Random(42)
+    fifos = [
+        FIFO([Entry(rng.randint(1, 100), rng.randint(1, 100)) for _ in range(size)])
+        for _ in range(books)
+    ]
+    prices = [rng.random() * 100 for _ in range(books)]
+
+    ## Python loop over inventory entries:
+    def loop():
+        return [
+            sum([e.quantity * (price - e.price) for e in fifo.inventory])
+            for fifo, price in zip(fifos, prices)
+        ]
+
+    ## Columnar open inventory, refreshed as books change between marks:
+    inventory = OpenInventory(fifos)
+
+    def columnar():
+        inventory.refresh()
+        return inventory.mark(prices)
+
+    report("mark/loop", min(timeit.repeat(loop, number=1, repeat=3)), books, "books")
+    report(
+        "mark/columnar (incl. refresh)",
+        min(timeit.repeat(columnar, number=1, repeat=3)),
+        books,
+        "books",
+    )
+
+
+def bench_follow(count=500000, batch=1000):
+    """
+    Benchmarks the per-update latency of following a growing file of
+    entries, including saving the state, at the beginning and the end.
+    """
+    import os
+    import shutil
+    import tempfile
+
+    from accfifo.follow import Follower
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "fills.csv")
+        follower = Follower([path], os.path.join(directory, "state.pickle"))
+        rows = ["%s,%s\n" % (e.quantity, e.price) for e in entries(count)]
+
+        ## Append batches of rows and time each update:
+        latencies = []
+        for start in range(0, count, batch):
+            with open(path, "a") as stream:
+                stream.writelines(rows[start : start + batch])
+            started = timeit.default_timer()
+            follower.poll()
+            follower.fifos[path].profit_and_loss
+            follower.save()
+            latencies.append(timeit.default_timer() - started)
+
+        ## Report the average latency of first and last ten updates:
+        print("%-40s: %10.4fs" % ("follow/first updates", sum(latencies[:10]) / 10))
+        print("%-40s: %10.4fs" % ("follow/last updates", sum(latencies[-10:]) / 10))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_parallel(count=1000000):
+    """
+    Benchmarks parallel computation of a single long ledger.
+    """
+    import os
+
+    from accfifo.parallel import compute
+
+    ## Prepare entries:
+    ledger = entries(count)
+
+    ## Sequential computation. Note that the FIFO accounting modifies
+    ## inventory entries, therefore it is computed on fresh copies
+    ## which are made outside of the timing:
+    def sequential(**kwargs):
+        timings = []
+        for _ in range(3):
+            copies = [e.copy() for e in ledger]
+            timings.append(timeit.timeit(lambda: FIFO(copies, **kwargs), number=1))
+        return min(timings)
+
+    ## Parallel computation with increasing number of processes:
+    for keep_trace in [True, False]:
+        report(
+            "parallel/sequential keep_trace=%s" % keep_trace,
+            sequential(keep_trace=keep_trace),
+            count,
+            "entries",
+        )
+        processes = 1
+        while processes <= 2 * (os.cpu_count() or 1):
+            report(
+                "parallel/processes=%d keep_trace=%s" % (processes, keep_trace),
+                min(
+                    timeit.repeat(
+                        lambda: compute(
+                            ledger, processes=processes, keep_trace=keep_trace
+                        ),
+                        number=1,
+                        repeat=3,
+                    )
+                ),
+                count,
+                "entries",
+            )
+            processes *= 2
+
+
+def bench_ledger(threads=8, keys=64, count=200000):
+    """
+    Benchmarks multi-threaded ingestion to a ledger with a single lock
+    (ie. one shard) against a sharded ledger.
+    """
+    import threading
+
+    from accfifo.ledger import Ledger
+
+    ## Prepare entries per thread:
+    rng = random.Random(42)
+    batches = [
+        [(rng.randrange(keys), e) for e in entries(count // threads, seed)]
+        for seed in range(threads)
+    ]
+
+    ## Ingest entries with multiple threads, while reading snapshots:
+    def ingest(shards):
+        ledger = Ledger(shards)
+        workers = [
+            threading.Thread(
+                target=lambda b: [ledger.add(k, e.copy()) for k, e in b], args=(b,)
+            )
+            for b in batches
+        ]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            ledger.snapshots()
+        for worker in workers:
+            worker.join()
+
+    for shards in [1, 16]:
+        report(
+            "ledger/shards=%d" % shards,
+            min(timeit.repeat(lambda: ingest(shards), number=1, repeat=3)),
+            count,
+            "entries",
+        )
+
+
+def bench_load(count=1000000):
+    """
+    Benchmarks loading entries from binary and numpy files against CSV
+    files as in the module runner.
+    """
+    import csv
+    import os
+    import shutil
+    import tempfile
+
+    from accfifo.loaders import dump_binary, iter_binary, iter_npy
+
+    ## Prepare files:
+    ledger = entries(count)
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "entries")
+        with open(path + ".csv", "w") as stream:
+            writer = csv.writer(stream)
+            for e in ledger:
+                writer.writerow([e.quantity, e.price, e.factor])
+        dump_binary(ledger, path + ".bin")
+
+        ## Load entries from CSV:
+        def load_csv():
+            return [
+                Entry(float(line[0]), float(line[1]), float(line[2]))
+                for line in csv.reader(open(path + ".csv"))
+            ]
+
+        ## Load entries from binary:
+        def load_binary():
+            return [e for batch in iter_binary(path + ".bin") for e in batch]
+
+        report(
+            "load/csv",
+            min(timeit.repeat(load_csv, number=1, repeat=3)),
+            count,
+            "entries",
+        )
+        report(
+            "load/binary",
+            min(timeit.repeat(load_binary, number=1, repeat=3)),
+            count,
+            "entries",
+        )
+
+        ## Load entries from numpy, if available:
+        try:
+            import numpy
+        except ImportError:
+            return
+        numpy.save(path + ".npy", [[e.quantity, e.price, e.factor] for e in ledger])
+        report(
+            "load/npy",
+            min(
+                timeit.repeat(
+                    lambda: [e for b in iter_npy(path + ".npy") for e in b],
+                    number=1,
+                    repeat=3,
+                )
+            ),
+            count,
+            "entries",
+        )
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_report(count=2000000):
+    """
+    Benchmarks writing closed inventory entries of a multi-million-pair
+    account by formatting the trace against streaming them during the
+    FIFO computation.
+    """
+    import os
+    import resource
+    import shutil
+    import tempfile
+
+    from accfifo.report import LotWriter, open_report
+
+    ## Peak memory of the process in MB (note that Linux reports in KB):
+    def peak():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+    ## Alternating buys and sells close an inventory entry per entry:
+    def generate():
+        return (
+            Entry(100 if i % 2 == 0 else -100, 10 + i % 7, timestamp=i)
+            for i in range(count)
+        )
+
+    directory = tempfile.mkdtemp()
+    try:
+        ## Materialize the trace and format pairs:
+        def trace():
+            fifo = FIFO(generate(), lazy=True)
+            with open(os.path.join(directory, "trace.txt"), "w") as stream:
+                for pair in fifo.trace:
+                    stream.write(",".join(["(%s)" % (e,) for e in pair]) + "\n")
+
+        ## Stream pairs during the computation:
+        def streaming(path, **kwargs):
+            with open_report(os.path.join(directory, path)) as stream:
+                writer = LotWriter(stream, **kwargs)
+                FIFO(generate(), lazy=True, observers=[writer], keep_trace=False).stock
+
+        ## Note that streaming runs first as peak memory only grows:
+        report(
+            "report/csv",
+            timeit.timeit(lambda: streaming("lots.csv"), number=1),
+            count // 2,
+            "pairs",
+        )
+        report(
+            "report/csv.gz (with columns)",
+            timeit.timeit(
+                lambda: streaming("lots.csv.gz", columns=["timestamp"]), number=1
+            ),
+            count // 2,
+            "pairs",
+        )
+        report(
+            "report/jsonl",
+            timeit.timeit(lambda: streaming("lots.jsonl", format="jsonl"), number=1),
+            count // 2,
+            "pairs",
+        )
+        print("%-40s: %10d MB" % ("report/peak memory (streaming)", peak()))
+        report("report/trace", timeit.timeit(trace, number=1), count // 2, "pairs")
+        print("%-40s: %10d MB" % ("report/peak memory (trace)", peak()))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    ## Run requested benchmarks, or all:
+    names = sys.argv[1:] or [
+        n[len("bench_") :] for n in sorted(globals()) if n.startswith("bench_")
+    ]
+    for name in names:
+        globals()["bench_%s" % name]()
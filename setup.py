@@ -17,6 +17,8 @@ setup(
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
         "Programming Language :: Python",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "License :: OSI Approved :: BSD License",
         "Topic :: Software Development :: Libraries",
     ],
@@ -25,4 +27,5 @@ setup(
     author_email="vst@vsthost.com",
     url="https://github.com/vst/accfifo",
     packages=["accfifo"],
+    python_requires=">=3.6",
 )
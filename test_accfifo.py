@@ -1,6 +1,19 @@
+import csv
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
 import unittest
 
-from accfifo import FIFO, Entry
+from accfifo import FIFO, Entry, FactorResolver
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestFIFO(unittest.TestCase):
@@ -484,6 +497,802 @@ class TestFIFO(unittest.TestCase):
         self.assertEqual(fifo.profit_and_loss, -788)
 
 
+class TestLazyFIFO(unittest.TestCase):
+    """
+    Tests lazy FIFO accounting.
+    """
+
+    def test_deferred(self):
+        ## Create a lazy FIFO accounting over a generator:
+        consumed = []
+
+        def entries():
+            for entry in [Entry(60, 10), Entry(10, 12), Entry(-80, 10)]:
+                consumed.append(entry)
+                yield entry
+
+        fifo = FIFO(entries(), lazy=True)
+
+        ## Nothing is computed yet:
+        self.assertFalse(fifo.is_computed)
+        self.assertEqual(len(consumed), 0)
+        self.assertIsNone(fifo.runtime)
+
+        ## Accessing a property computes the accounting:
+        self.assertEqual(fifo.stock, -10)
+        self.assertTrue(fifo.is_computed)
+        self.assertEqual(len(consumed), 3)
+        self.assertIsNotNone(fifo.runtime)
+
+        ## Entries are not retained:
+        self.assertIsNone(fifo._entries)
+
+        ## Results are same as the eager computation:
+        self.assertEqual(fifo.avgcost, 10)
+        self.assertEqual(fifo.profit_and_loss, 20)
+        self.assertEqual(len(fifo.trace), 2)
+
+    def test_computed_fields(self):
+        ## Each computed field triggers the computation:
+        for name in ["inventory", "trace", "is_empty", "valuation"]:
+            fifo = FIFO(iter([Entry(100, 10)]), lazy=True)
+            getattr(fifo, name)
+            self.assertTrue(fifo.is_computed)
+            self.assertEqual(fifo.stock, 100)
+
+    def test_no_entries(self):
+        fifo = FIFO(lazy=True)
+        self.assertTrue(fifo.is_empty)
+        self.assertIsNone(fifo.avgcost)
+
+    def test_failure(self):
+        ## Create a lazy FIFO accounting over a failing generator:
+        def entries():
+            yield Entry(10, 1)
+            raise ValueError("broken stream")
+
+        fifo = FIFO(entries(), lazy=True)
+
+        ## The first and later accesses fail without exposing partial state:
+        for _ in range(2):
+            with self.assertRaises(RuntimeError) as context:
+                fifo.stock
+            self.assertIsInstance(context.exception.__cause__, ValueError)
+            self.assertFalse(fifo.is_computed)
+
+    def test_attribute_error(self):
+        ## Attribute errors during the computation are not hidden:
+        def entries():
+            yield Entry(10, 1)
+            raise AttributeError("broken")
+
+        fifo = FIFO(entries(), lazy=True)
+        with self.assertRaises(RuntimeError) as context:
+            fifo.stock
+        self.assertIsInstance(context.exception.__cause__, AttributeError)
+
+    def test_missing_attribute(self):
+        fifo = FIFO([Entry(100, 10)], lazy=True)
+        self.assertRaises(AttributeError, getattr, fifo, "missing")
+        self.assertFalse(fifo.is_computed)
+
+
+class TestPreview(unittest.TestCase):
+    """
+    Tests previews of hypothetical entries.
+    """
+
+    entries = [
+        Entry(60, 10, 2),
+        Entry(-10, 12, 2),
+        Entry(-20, 10, 2),
+        Entry(50, 12, 2),
+        Entry(-60, 14, 2),
+        Entry(10, 21, 2),
+    ]
+
+    def assertPreview(self, entries, entry):
+        ## Build the FIFO accounting and keep its state:
+        fifo = FIFO([e.copy() for e in entries])
+        inventory = [(e.quantity, e.price) for e in fifo.inventory]
+        trace = len(fifo.trace)
+        stock = fifo.stock
+
+        ## Preview the entry:
+        preview = fifo.preview(entry)
+
+        ## The FIFO accounting is not modified:
+        self.assertEqual([(e.quantity, e.price) for e in fifo.inventory], inventory)
+        self.assertEqual(len(fifo.trace), trace)
+        self.assertEqual(fifo.stock, stock)
+
+        ## The preview is same as the FIFO accounting with the entry:
+        expected = FIFO([e.copy() for e in entries] + [entry])
+        self.assertEqual(preview.stock, expected.stock)
+        self.assertEqual(preview.avgcost, expected.avgcost)
+        self.assertEqual(preview.avgcost_factored, expected.avgcost_factored)
+        self.assertEqual(
+            preview.profit_and_loss, expected.profit_and_loss - fifo.profit_and_loss
+        )
+        self.assertEqual(
+            preview.profit_and_loss_factored,
+            expected.profit_and_loss_factored - fifo.profit_and_loss_factored,
+        )
+        self.assertEqual(
+            [[(e.quantity, e.price) for e in pair] for pair in preview.trace],
+            [[(e.quantity, e.price) for e in pair] for pair in expected.trace[trace:]],
+        )
+
+    def test_push(self):
+        self.assertPreview(self.entries, Entry(10, 20, 2))
+        self.assertPreview([], Entry(-10, 20, 2))
+
+    def test_partial_fill(self):
+        self.assertPreview(self.entries, Entry(-5, 20, 2))
+        self.assertPreview(self.entries, Entry(-20, 20, 2))
+
+    def test_multiple_fill(self):
+        self.assertPreview(self.entries, Entry(-25, 20, 2))
+        self.assertPreview(self.entries, Entry(-30, 20, 2))
+
+    def test_reverse(self):
+        self.assertPreview(self.entries, Entry(-45, 20, 2))
+
+    def test_zero(self):
+        self.assertPreview(self.entries, Entry(0, 20, 2))
+
+    def test_float_prices(self):
+        ## Build a long FIFO accounting with float prices:
+        rng = random.Random(42)
+        entries = [
+            Entry(rng.randint(-100, 100), rng.uniform(1, 100), rng.uniform(1, 2))
+            for _ in range(5000)
+        ]
+        fifo = FIFO([e.copy() for e in entries])
+
+        ## Preview is same as the FIFO accounting with the entry, up to rounding:
+        for entry in [Entry(10, 50.5), Entry(-10, 50.5), Entry(-fifo.stock - 5, 2.5)]:
+            preview = fifo.preview(entry)
+            expected = FIFO([e.copy() for e in entries] + [entry])
+            self.assertEqual(preview.stock, expected.stock)
+            self.assertAlmostEqual(preview.avgcost, expected.avgcost, places=6)
+            self.assertAlmostEqual(
+                preview.avgcost_factored, expected.avgcost_factored, places=6
+            )
+
+    def test_exhausted(self):
+        ## Running valuations are reset as the inventory is exhausted:
+        fifo = FIFO([Entry(3, 0.1), Entry(3, 0.2), Entry(-6, 0.3)])
+        self.assertEqual(fifo._valuation, 0)
+        self.assertEqual(fifo._valuation_factored, 0)
+        fifo = FIFO([Entry(3, 0.1), Entry(3, 0.2)])
+        self.assertEqual(fifo.preview(Entry(-6, 0.3)).valuation, 0)
+
+
+class TestFactorResolver(unittest.TestCase):
+    """
+    Tests memoized factor resolution.
+    """
+
+    def setUp(self):
+        ## Count the calls to the resolver function:
+        self.calls = []
+
+        def rate(currency):
+            self.calls.append(currency)
+            return {"USD": 1, "EUR": 2}[currency]
+
+        self.resolver = FactorResolver(rate, ["currency"], maxsize=8)
+
+    def test_entry(self):
+        entries = [Entry(10, 5, self.resolver, currency="EUR") for _ in range(3)]
+        self.assertEqual([e.factor for e in entries], [2, 2, 2])
+        self.assertEqual(self.calls, ["EUR"])
+        self.assertEqual(self.resolver.hits, 2)
+        self.assertEqual(self.resolver.misses, 1)
+        self.assertEqual(self.resolver.size, 1)
+
+    def test_fifo(self):
+        fifo = FIFO(
+            [
+                Entry(60, 10, currency="EUR"),
+                Entry(10, 12, currency="USD"),
+                Entry(-50, 10, currency="EUR"),
+            ],
+            resolver=self.resolver,
+        )
+        self.assertEqual(fifo.valuation_factored, 10 * 10 * 2 + 10 * 12)
+        self.assertEqual(self.resolver.misses, 2)
+        self.assertEqual(self.resolver.hits, 1)
+
+        ## Previews resolve factors, too:
+        preview = fifo.preview(Entry(-20, 10, currency="USD"))
+        self.assertEqual(preview.valuation_factored, 0)
+        self.assertEqual(self.resolver.hits, 2)
+
+    def test_shared_entries(self):
+        ## Build two FIFO accountings over same entries with different resolvers:
+        entries = [Entry(20, 10, 3, currency="EUR"), Entry(-10, 12, currency="EUR")]
+        a = FIFO(entries, resolver=self.resolver)
+        b = FIFO(entries, resolver=FactorResolver(lambda c: 3, ["currency"]))
+
+        ## Given entries are not modified:
+        self.assertEqual([e.factor for e in entries], [3, 1])
+
+        ## FIFO accountings are not affected by each other:
+        self.assertEqual(a.valuation_factored, 200)
+        self.assertEqual(a._valuation_factored, 200)
+        self.assertEqual(b.valuation_factored, 300)
+        self.assertEqual(b._valuation_factored, 300)
+
+    def test_preload(self):
+        self.resolver.preload([("EUR",), ("USD",), ("EUR",)])
+        self.assertEqual(sorted(self.calls), ["EUR", "USD"])
+        self.assertEqual(self.resolver("EUR"), 2)
+        self.assertEqual(self.resolver.hits, 1)
+
+        ## Clear the cache:
+        self.resolver.clear()
+        self.assertEqual(self.resolver.size, 0)
+        self.assertEqual(self.resolver.hits, 0)
+
+    def test_bounded(self):
+        resolver = FactorResolver(lambda x: x, ["x"], maxsize=2)
+        resolver.preload([(1,), (2,), (3,)])
+        self.assertEqual(resolver.size, 2)
+
+
+class TestParallel(unittest.TestCase):
+    """
+    Tests parallel FIFO accounting.
+    """
+
+    def assertSameFIFO(self, entries, **kwargs):
+        from accfifo.parallel import compute
+
+        ## Compute sequentially and in parallel:
+        expected = FIFO([e.copy() for e in entries])
+        fifo = compute([e.copy() for e in entries], **kwargs)
+
+        ## Results must be identical:
+        dump = lambda e: (e.quantity, e.price, e.factor, e.data, e.index)
+        self.assertEqual(
+            [[dump(e) for e in pair] for pair in fifo.trace],
+            [[dump(e) for e in pair] for pair in expected.trace],
+        )
+        self.assertEqual(
+            [dump(e) for e in fifo.inventory], [dump(e) for e in expected.inventory]
+        )
+        self.assertEqual(fifo.stock, expected.stock)
+        self.assertEqual(fifo.avgcost, expected.avgcost)
+        self.assertEqual(fifo.profit_and_loss, expected.profit_and_loss)
+        self.assertIsNotNone(fifo.runtime)
+
+    def test_no_entries(self):
+        self.assertSameFIFO([], processes=2)
+
+    def test_random(self):
+        rng = random.Random(42)
+        for chunks in [1, 2, 3, 7, 50]:
+            entries = [
+                Entry(rng.randint(-5, 5), rng.randint(1, 20), index=i)
+                for i in range(200)
+            ]
+            self.assertSameFIFO(entries, chunks=chunks, processes=2)
+
+    def test_no_trace(self):
+        from accfifo.parallel import compute
+
+        rng = random.Random(42)
+        entries = [
+            Entry(rng.randint(-5, 5), rng.randint(1, 20), rng.choice([1, 2]))
+            for _ in range(500)
+        ]
+        expected = FIFO([e.copy() for e in entries])
+        for chunks in [1, 3, 50]:
+            fifo = compute(entries, chunks=chunks, processes=2, keep_trace=False)
+            self.assertIsNone(fifo.trace)
+            self.assertEqual(
+                [(e.quantity, e.price) for e in fifo.inventory],
+                [(e.quantity, e.price) for e in expected.inventory],
+            )
+            self.assertEqual(fifo.stock, expected.stock)
+            self.assertEqual(fifo.profit_and_loss, expected.profit_and_loss)
+            self.assertEqual(
+                fifo.profit_and_loss_factored, expected.profit_and_loss_factored
+            )
+
+    def test_zero_quantities(self):
+        ## Zero-quantity entries are skipped, even if the stock is not positive:
+        entries = [Entry(0, 3), Entry(2, 2), Entry(0, 5), Entry(-1, 5), Entry(-3, 3)]
+        fifo = FIFO([e.copy() for e in entries])
+        self.assertEqual(fifo.stock, -2)
+        self.assertEqual([(e.quantity, e.price) for e in fifo.inventory], [(-2, 3)])
+        self.assertEqual(fifo.stock, sum([e.quantity for e in fifo.inventory]))
+        for chunks in range(1, len(entries) + 1):
+            self.assertSameFIFO(entries, chunks=chunks, processes=2)
+
+    def test_carried_stock(self):
+        ## Chunks closing and reversing the stock carried from previous chunks:
+        entries = [Entry(10, 1), Entry(20, 2), Entry(-5, 3), Entry(-40, 4)]
+        entries += [Entry(5, 5), Entry(30, 6), Entry(-1, 7), Entry(-2, 8)]
+        for chunks in range(1, len(entries) + 1):
+            self.assertSameFIFO(entries, chunks=chunks, processes=2)
+
+
+class TestExtend(unittest.TestCase):
+    """
+    Tests extending FIFO accounting with further entries.
+    """
+
+    def test_extend(self):
+        fifo = FIFO([Entry(60, 10), Entry(10, 12)])
+        fifo.extend([Entry(-80, 10)])
+        self.assertEqual(fifo.stock, -10)
+        self.assertEqual(fifo.avgcost, 10)
+        self.assertEqual(fifo.profit_and_loss, 20)
+
+    def test_extend_lazy(self):
+        fifo = FIFO(iter([Entry(60, 10), Entry(10, 12)]), lazy=True)
+        fifo.extend(iter([Entry(-80, 10)]))
+        self.assertEqual(fifo.stock, -10)
+        self.assertEqual(fifo.profit_and_loss, 20)
+
+
+class TestFollower(unittest.TestCase):
+    """
+    Tests following files of entries.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "fills.csv")
+        self.state = os.path.join(self.directory, "state.pickle")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def append(self, content):
+        with open(self.path, "a") as stream:
+            stream.write(content)
+
+    def test_follow(self):
+        from accfifo.follow import Follower
+
+        ## Nothing to follow yet:
+        follower = Follower([self.path], self.state)
+        self.assertEqual(follower.poll(), [])
+
+        ## Incomplete rows are not consumed:
+        self.append("60,10\n10,12\n-50")
+        self.assertEqual(follower.poll(), [self.path])
+        self.assertEqual(follower.fifos[self.path].stock, 70)
+        self.assertEqual(follower.poll(), [])
+
+        ## Complete the row:
+        self.append(",10\n")
+        self.assertEqual(follower.poll(), [self.path])
+        self.assertEqual(follower.fifos[self.path].stock, 20)
+        self.assertEqual(follower.fifos[self.path].avgcost, 11)
+        follower.save()
+
+        ## Restart and resume:
+        self.append("-30,10,2\n")
+        follower = Follower([self.path], self.state)
+        self.assertEqual(follower.fifos[self.path].stock, 20)
+        self.assertEqual(follower.poll(), [self.path])
+        self.assertEqual(follower.fifos[self.path].stock, -10)
+        self.assertEqual(follower.fifos[self.path].profit_and_loss, 20)
+
+    def test_state_size(self):
+        from accfifo.follow import Follower
+
+        ## Closed inventory entries do not grow the state:
+        follower = Follower([self.path], self.state)
+        sizes = []
+        for batch in range(10):
+            self.append("".join(["10,%d\n-10,%d\n" % (i, i + 1) for i in range(500)]))
+            follower.poll()
+            follower.save()
+            sizes.append(os.path.getsize(self.state))
+        self.assertIsNone(follower.fifos[self.path].trace)
+        self.assertLess(sizes[-1] - sizes[0], 100)
+
+        ## The realized profit and loss is restored:
+        follower = Follower([self.path], self.state)
+        self.assertEqual(follower.fifos[self.path].profit_and_loss, -50000)
+        self.assertEqual(follower.fifos[self.path].stock, 0)
+
+    def test_bad_row(self):
+        from accfifo.follow import Follower
+
+        follower = Follower([self.path], self.state)
+        self.append("10,1\n")
+        follower.poll()
+        follower.save()
+
+        ## A bad row consumes none of the appended rows:
+        self.append("5,1\nbad,1\n")
+        self.assertRaises(ValueError, follower.poll)
+        self.assertEqual(follower.fifos[self.path].stock, 10)
+        follower.save()
+
+        ## Fix the file and restart:
+        with open(self.path, "w") as stream:
+            stream.write("10,1\n5,1\n7,1\n")
+        follower = Follower([self.path], self.state)
+        self.assertEqual(follower.poll(), [self.path])
+        self.assertEqual(follower.fifos[self.path].stock, 22)
+
+    def test_truncated(self):
+        from accfifo.follow import Follower
+
+        follower = Follower([self.path])
+        self.append("60,10\n")
+        follower.poll()
+
+        ## Truncate the file and follow from its beginning:
+        os.remove(self.path)
+        self.append("-1,1\n")
+        self.assertEqual(follower.poll(), [self.path])
+        self.assertEqual(follower.fifos[self.path].stock, 59)
+
+
+class TestLedger(unittest.TestCase):
+    """
+    Tests the thread-safe ledger.
+    """
+
+    def test_snapshot(self):
+        from accfifo.ledger import Ledger
+
+        ledger = Ledger(shards=4)
+        self.assertIsNone(ledger.snapshot("A"))
+
+        ## Add entries:
+        ledger.extend("A", [Entry(60, 10), Entry(10, 12)])
+        ledger.add("A", Entry(-80, 10))
+        ledger.add("B", Entry(10, 5))
+
+        ## Check snapshots:
+        self.assertEqual(ledger.snapshot("A"), (-10, 10, 20))
+        self.assertEqual(ledger.snapshot("B"), (10, 5, 0))
+        self.assertEqual(ledger.snapshots(), {"A": (-10, 10, 20), "B": (10, 5, 0)})
+
+    def test_failed_extend(self):
+        from accfifo.ledger import Ledger
+
+        def entries():
+            yield Entry(60, 10)
+            yield Entry(-10, 12)
+            raise ValueError("broken")
+
+        ## Entries consumed before the failure are accounted for:
+        ledger = Ledger(shards=1)
+        self.assertRaises(ValueError, ledger.extend, "A", entries())
+        ledger.add("A", Entry(-50, 13))
+        self.assertEqual(ledger.snapshot("A"), (0, None, -170))
+
+    def test_threads(self):
+        from accfifo.ledger import Ledger
+
+        ## Prepare entries per key:
+        rng = random.Random(42)
+        keys = dict(
+            (
+                key,
+                [Entry(rng.randint(-50, 50), rng.randint(1, 20)) for _ in range(500)],
+            )
+            for key in range(8)
+        )
+
+        ## Add entries of each key from two threads, in order:
+        ledger = Ledger(shards=3)
+        locks = dict((key, threading.Lock()) for key in keys)
+        positions = dict((key, 0) for key in keys)
+
+        def ingest():
+            for _ in range(2000):
+                key = rng.choice(list(keys))
+                with locks[key]:
+                    if positions[key] < len(keys[key]):
+                        ledger.add(key, keys[key][positions[key]].copy())
+                        positions[key] += 1
+
+        workers = [threading.Thread(target=ingest) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        ## Compare against FIFO accountings:
+        for key, entries in keys.items():
+            fifo = FIFO([e.copy() for e in entries[: positions[key]]])
+            snapshot = ledger.snapshot(key)
+            self.assertEqual(snapshot.stock, fifo.stock)
+            self.assertEqual(snapshot.avgcost, fifo.avgcost)
+            self.assertEqual(snapshot.profit_and_loss, fifo.profit_and_loss)
+
+
+class TestLoaders(unittest.TestCase):
+    """
+    Tests loading entries from binary and numpy files.
+    """
+
+    entries = [Entry(60, 10, 2, t=1), Entry(10, 12, 1, t=2), Entry(-80, 10, 2, t=3)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertEntries(self, entries, expected, names=()):
+        self.assertEqual(
+            [(e.quantity, e.price, e.factor, e.data) for e in entries],
+            [
+                (e.quantity, e.price, e.factor, dict((n, e.data[n]) for n in names))
+                for e in expected
+            ],
+        )
+
+    def test_binary(self):
+        from accfifo.loaders import dump_binary, iter_binary, load
+
+        path = os.path.join(self.directory, "entries.bin")
+
+        ## Load without data:
+        dump_binary(self.entries, path)
+        batches = list(iter_binary(path, batchsize=2))
+        self.assertEqual([len(b) for b in batches], [2, 1])
+        self.assertEntries([e for b in batches for e in b], self.entries)
+
+        ## Load with data, ignoring the trailing incomplete record:
+        dump_binary(self.entries, path, "<dddq", ["t"])
+        with open(path, "ab") as stream:
+            stream.write(b"\0\0")
+        batches = list(iter_binary(path, "<dddq", ["t"]))
+        self.assertEntries([e for b in batches for e in b], self.entries, ["t"])
+
+        ## Load native records which are padded for alignment:
+        dump_binary(self.entries, path, "dddi", ["t"])
+        batches = list(iter_binary(path, "dddi", ["t"], batchsize=2))
+        self.assertEntries([e for b in batches for e in b], self.entries, ["t"])
+
+        ## Feed a FIFO accounting:
+        fifo = load(iter_binary(path, "dddi"))
+        self.assertEqual(fifo.stock, -10)
+        self.assertEqual(fifo.profit_and_loss, 20)
+
+    def test_binary_empty(self):
+        from accfifo.loaders import iter_binary
+
+        path = os.path.join(self.directory, "entries.bin")
+        open(path, "wb").close()
+        self.assertEqual(list(iter_binary(path)), [])
+
+    @unittest.skipIf(numpy is None, "numpy is not available")
+    def test_npy(self):
+        from accfifo.loaders import iter_npy
+
+        path = os.path.join(self.directory, "entries.npy")
+        numpy.save(
+            path, [[e.quantity, e.price, e.factor, e.data["t"]] for e in self.entries]
+        )
+        batches = list(iter_npy(path, batchsize=2))
+        self.assertEqual([len(b) for b in batches], [2, 1])
+        self.assertEntries([e for b in batches for e in b], self.entries)
+        batches = list(iter_npy(path, ["t"]))
+        self.assertEntries([e for b in batches for e in b], self.entries, ["t"])
+
+
+class TestHoldingPeriods(unittest.TestCase):
+    """
+    Tests holding period analytics.
+    """
+
+    def test_indices(self):
+        from accfifo.analytics import HoldingPeriods
+
+        ## Compute the FIFO accounting with the observer:
+        periods = HoldingPeriods([1, 3])
+        fifo = FIFO(
+            [Entry(60, 10), Entry(10, 12), Entry(0, 1), Entry(-65, 10), Entry(5, 1)],
+            observers=[periods],
+        )
+
+        ## Entries are stamped with their positions:
+        self.assertEqual(
+            [[e.index for e in pair] for pair in fifo.trace], [[0, 3], [1, 3]]
+        )
+        self.assertEqual([e.index for e in fifo.inventory], [1, 4])
+
+        ## Holding periods: 60 for 3 and 5 for 2:
+        self.assertEqual(periods.holding.counts, [0, 5, 60])
+
+        ## Open inventory ages as of 5: 5 for 4 and 5 for 0:
+        self.assertEqual(periods.open, {1: 5, 4: 5})
+        self.assertEqual(periods.ages(5).counts, [0, 5, 5])
+
+    def test_shared_entries(self):
+        from accfifo.analytics import HoldingPeriods
+
+        ## Given entries are not stamped, therefore they can be shared:
+        entries = [Entry(60, 10), Entry(-10, 12)]
+        fifo = FIFO(entries, observers=[HoldingPeriods([1])])
+        FIFO([Entry(1, 1), Entry(1, 1)] + entries, observers=[HoldingPeriods([1])])
+        self.assertEqual([e.index for e in fifo.inventory], [0])
+        self.assertEqual([e.index for e in entries], [None, None])
+
+        ## Entries are not stamped without observers:
+        fifo = FIFO(entries)
+        self.assertIsNone(fifo.inventory[0].index)
+
+    def test_clock(self):
+        from accfifo.analytics import HoldingPeriods
+
+        ## Compute the FIFO accounting with the observer:
+        periods = HoldingPeriods([10, 100], lambda e: e.data["t"])
+        FIFO(
+            [Entry(-10, 10, t=0), Entry(20, 12, t=50), Entry(-10, 12, t=200)],
+            observers=[periods],
+        )
+        self.assertEqual(periods.holding.counts, [0, 10, 10])
+        self.assertEqual(periods.ages(205).counts, [0, 0, 0])
+        self.assertEqual(periods.open, {})
+
+
+class TestLotWriter(unittest.TestCase):
+    """
+    Tests streaming reports of closed inventory entries.
+    """
+
+    entries = [
+        Entry(60, 10, 2, t="a"),
+        Entry(10, 12, 1, t="b"),
+        Entry(-80, 11, 1, t="c"),
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_keep_trace(self):
+        fifo = FIFO([e.copy() for e in self.entries], keep_trace=False)
+        expected = FIFO([e.copy() for e in self.entries])
+        self.assertIsNone(fifo.trace)
+        self.assertEqual(fifo.profit_and_loss, expected.profit_and_loss)
+        self.assertEqual(
+            fifo.profit_and_loss_factored, expected.profit_and_loss_factored
+        )
+        self.assertEqual(fifo.stock, expected.stock)
+
+    def test_csv(self):
+        from accfifo.report import LotWriter, open_report
+
+        ## Write the report:
+        path = os.path.join(self.directory, "lots.csv.gz")
+        with open_report(path) as stream:
+            writer = LotWriter(stream, columns=["t"])
+            FIFO([e.copy() for e in self.entries], observers=[writer], keep_trace=False)
+
+        ## Read the report:
+        with gzip.open(path, "rt", newline="") as stream:
+            rows = list(csv.reader(stream))
+        self.assertEqual(rows[0][-2:], ["open_t", "close_t"])
+        self.assertEqual(
+            rows[1:],
+            [
+                ["0", "2", "60", "10", "11", "-60", "540", "a", "c"],
+                ["1", "2", "10", "12", "11", "10", "10", "b", "c"],
+            ],
+        )
+
+    def test_jsonl(self):
+        from accfifo.report import LotWriter, open_report
+
+        ## Write the report:
+        path = os.path.join(self.directory, "lots.jsonl")
+        with open_report(path) as stream:
+            writer = LotWriter(stream, "jsonl")
+            fifo = FIFO([e.copy() for e in self.entries], observers=[writer])
+
+        ## Read the report:
+        with open(path) as stream:
+            rows = [json.loads(line) for line in stream]
+        self.assertEqual(len(rows), len(fifo.trace))
+        self.assertEqual(
+            sum([row["profit_and_loss"] for row in rows]), fifo.profit_and_loss
+        )
+        self.assertEqual(rows[1]["quantity"], 10)
+
+    def test_utf8(self):
+        from accfifo.report import LotWriter, open_report
+
+        ## Reports are encoded in UTF-8 with or without compression:
+        entries = [Entry(1, 1, t="\u20ac"), Entry(-1, 2, t="\u00e7")]
+        for name, read in [("lots.csv", open), ("lots.csv.gz", gzip.open)]:
+            path = os.path.join(self.directory, name)
+            with open_report(path) as stream:
+                writer = LotWriter(stream, columns=["t"])
+                FIFO(entries, observers=[writer], keep_trace=False)
+            with read(path, "rb") as stream:
+                self.assertTrue(stream.read().endswith("\u20ac,\u00e7\r\n".encode()))
+
+    def test_unknown_format(self):
+        from accfifo.report import LotWriter
+
+        self.assertRaises(ValueError, LotWriter, None, "xml")
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestOpenInventory(unittest.TestCase):
+    """
+    Tests columnar mark-to-market of open inventories.
+    """
+
+    def test_mark(self):
+        from accfifo.columnar import OpenInventory
+
+        ## Create books:
+        fifos = [
+            FIFO([Entry(60, 10, 2), Entry(10, 12, 2), Entry(-50, 10, 2)]),
+            FIFO(),
+            FIFO([Entry(60, 10), Entry(10, 12), Entry(-80, 10)]),
+        ]
+        inventory = OpenInventory(fifos)
+        self.assertEqual(inventory.books, 3)
+        self.assertEqual(list(inventory.stock), [20, 0, -10])
+
+        ## Mark books:
+        unrealized, exposure = inventory.mark([15, 15, 15])
+        self.assertEqual(list(unrealized), [80, 0, -50])
+        self.assertEqual(list(exposure), [300, 0, -150])
+
+        ## Mark books with factors:
+        unrealized, exposure = inventory.mark_factored([15, 15, 15])
+        self.assertEqual(list(unrealized), [160, 0, -50])
+        self.assertEqual(list(exposure), [600, 0, -150])
+
+        ## Compare against inventory entries:
+        for fifo, value in zip(fifos, unrealized):
+            self.assertEqual(
+                sum([e.quantity * (15 - e.price) * e.factor for e in fifo.inventory]),
+                value,
+            )
+
+    def test_refresh(self):
+        from accfifo.columnar import OpenInventory
+
+        ## Compute books further and refresh:
+        rng = random.Random(42)
+        fifos = [FIFO() for _ in range(5)]
+        inventory = OpenInventory(fifos)
+        for _ in range(3):
+            for fifo in fifos:
+                fifo.extend(
+                    [
+                        Entry(
+                            rng.randint(-50, 50), rng.randint(1, 20), rng.randint(1, 3)
+                        )
+                        for _ in range(50)
+                    ]
+                )
+            inventory.refresh()
+
+            ## Compare against inventory entries:
+            unrealized, exposure = inventory.mark_factored([15] * 5)
+            for fifo, value in zip(fifos, unrealized):
+                self.assertEqual(
+                    sum(
+                        [e.quantity * (15 - e.price) * e.factor for e in fifo.inventory]
+                    ),
+                    value,
+                )
+
+
 if __name__ == "__main__":
     ## Test the above:
     unittest.main()